@@ -1,101 +1,183 @@
+import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import nullcontext
+from itertools import groupby
+from logging.handlers import QueueHandler, QueueListener
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
-import math
 
 
+log = logging.getLogger(__name__)
+
 FOLDER_PATH = "final_rfq_from_mfg's_olive"
 OUTPUT_FILE = "consolidated_Olive_file.xlsx"
 OUTPUT_SHEETNAME = "Consolidated" 
 
-
-def detect_header_row(file_path, sheet_name='Mapped Sheet'):
-    """Find header row by searching for 'M.Item Name'."""
-    preview = None
+# Specific renamings requested by the user
+COLUMN_RENAMES = {
+    'Amanta (Volume Share %)': 'Volume Share',
+    'Amanta (Volume )': 'Volume',
+    # Add mappings for the columns the user wants to fix
+    'Projected MFS Annual Qty at Unit level': 'Projected MFS Annual Qty Unit Level',
+    'FORM OR UNIT TYPE': 'Form or Unit Type',
+    'MFG Therapy Name': 'MFG Therapy Name', # Explicitly keep this
+    'Potential at pack': 'Potential at Pack Level',
+}
+
+# Desired final column order based on user's implicit order and requirements
+# Kept as a pd.Index so reindex and the membership checks reuse one hashed index instead of rebuilding it per file
+DESIRED_COLUMNS = pd.Index([
+    "Manufacturer",
+    "Hospital Name",
+    "MFS",
+    "Therapy",
+    "Projected MFS Annual Qty Unit Level", # This should now be populated
+    "Form or Unit Type", # This should now be populated
+    "Volume Share",
+    "Volume",
+    "M.Item Name",
+    "MFG Therapy Name", # This should now be populated
+    "Potential at Pack Level", # This should now be populated
+    "FORM OR UNIT TYPE BY AP",
+    "UPP",
+    "UPP BY AP",
+    "MRP / Pack level",
+    "Cost / Pack level",
+    "MRP / Unit level",
+    "Cost / Unit level",
+    "GST%",
+    "Quote Validity till date",
+    "Scheme",
+    "Scheme Validity till date",
+    "Turn Over Discount",
+    "TOD Validity till date",
+])
+
+# Header fill colors for the output sheet
+HEADER_COLORS = {
+    'light_orange': "#FFD580",
+    'light_green': "#C6EFCE",
+    'highlight_yellow': "#FFFF00",
+}
+
+# Columns to highlight in yellow (only inserted custom columns)
+# These should now be the ones the user explicitly mentioned are missing
+NEWLY_ADDED_OR_FIXED = [
+    'Projected MFS Annual Qty Unit Level',
+    'Form or Unit Type',
+    'Potential at Pack Level',
+    'MFG Therapy Name' # Also highlight this as it was mentioned
+]
+
+# A file contributes nothing useful unless at least one of these columns has data
+CRITICAL_COLUMNS = ['MFS', 'Volume']
+
+
+def open_excel_file(file_path):
+    """Open a workbook once with the calamine engine, falling back to openpyxl for files calamine rejects.
+
+    Use it as a context manager; every sheet parsed from the returned pd.ExcelFile reuses the same open workbook.
+    """
     try:
-        # Increase the number of rows to check for the header
-        preview = pd.read_excel(file_path, sheet_name=sheet_name, header=None, nrows=50)
-
+        # calamine (python-calamine) streams the sheet XML instead of building openpyxl's full DOM
+        return pd.ExcelFile(file_path, engine="calamine")
     except Exception as e:
-        print(f"Error reading file {file_path} or sheet '{sheet_name}' during header detection: {e}")
-        raise # Re-raise the exception after printing
-
-    if preview is not None:
-        for idx, row in preview.iterrows():
-            if any(str(cell).strip() == 'M.Item Name' for cell in row if pd.notna(cell)):
-                return idx
-
-        # If loop finishes without finding header, raise error
-        raise ValueError(f"'M.Item Name' not found in top 50 rows of sheet '{sheet_name}' in file: {file_path}")
-    else:
-         raise RuntimeError(f"Failed to load preview data for {file_path}, sheet '{sheet_name}'. Cannot proceed with header detection.")
+        log.warning("⚠️ calamine could not read %s (%s: %s), retrying with openpyxl", file_path, type(e).__name__, e)
+        return pd.ExcelFile(file_path, engine="openpyxl")
+
+
+def find_header_row(raw_df, file_path, sheet_name='Mapped Sheet'):
+    """Find header row in an already loaded (header=None) sheet by searching every column of its top 50 rows for 'M.Item Name'."""
+    # Strip and compare every cell in numpy's C loops instead of a per-cell Python loop
+    cells = raw_df.iloc[:50].to_numpy(dtype=object, na_value="").astype(str)
+    hits = (np.char.strip(cells) == 'M.Item Name').any(axis=1)
+    if hits.any():
+        return int(hits.argmax())
+
+    # If no row matched, raise error
+    raise ValueError(f"'M.Item Name' not found in top 50 rows of sheet '{sheet_name}' in file: {file_path}")
+
+
+def split_at_header(raw_df, header_row, is_float_column=None):
+    """Rebuild the dataframe read_excel(header=header_row) would return from a sheet read with header=None.
+
+    Columns whose name satisfies is_float_column are typed as float64 up front (text becomes NaN),
+    like passing dtype= to read_excel, so later steps do not have to coerce them again.
+    """
+    # Name the columns the way pandas does: blank headers become 'Unnamed: N', duplicates get '.1', '.2', ...
+    columns = []
+    seen = {}
+    for pos, name in enumerate(raw_df.iloc[header_row]):
+        if pd.isna(name):
+            name = f"Unnamed: {pos}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+
+    df = raw_df.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = columns
+
+    # The header row (and anything above it) forced text dtypes onto every column, so re-infer them.
+    # Like read_excel, a text column becomes numeric only if every value in it converts cleanly.
+    df = df.infer_objects()
+    for pos in range(df.shape[1]):
+        col = df.iloc[:, pos]
+        if is_float_column is not None and is_float_column(columns[pos]):
+            df.isetitem(pos, coerce_numeric(col).astype(float))
+        elif pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+            try:
+                df.isetitem(pos, pd.to_numeric(col))
+            except (ValueError, TypeError):
+                pass
+    return df
 
 
-def custom_round(x):
-    """Rounds a number to the nearest integer, rounding up for >= 0.5."""
-    if pd.isna(x):
-        return x
-    return int(math.floor(x + 0.5))
+def coerce_numeric(col):
+    """Coerce a column to numeric (unparseable values become NaN), skipping columns that already are numeric."""
+    if pd.api.types.is_numeric_dtype(col):
+        return col
+    return pd.to_numeric(col, errors='coerce')
 
 
 def clean_columns(df):
     """Rename & unify columns per requirements, consolidate volume data, and drop unnecessary columns."""
     df.columns = df.columns.str.strip()
-    colmap = {}
     cols_to_drop = []
 
-    # Specific renamings requested by the user
-    colmap['Amanta (Volume Share %)'] = 'Volume Share'
-    colmap['Amanta (Volume )'] = 'Volume'
-    # Add mappings for the columns the user wants to fix
-    colmap['Projected MFS Annual Qty at Unit level'] = 'Projected MFS Annual Qty Unit Level'
-    colmap['FORM OR UNIT TYPE'] = 'Form or Unit Type'
-    colmap['MFG Therapy Name'] = 'MFG Therapy Name' # Explicitly keep this
-    colmap['Potential at pack'] = 'Potential at Pack Level'
-
-
     # Apply specific renamings first to standardize column names
-    df.rename(columns=colmap, inplace=True)
+    df.rename(columns=COLUMN_RENAMES, inplace=True)
 
     # Identify all potential source columns for Volume (case-insensitive, looking for "volume" anywhere)
-    volume_cols = [col for col in df.columns if "volume" in col.lower() and "volume share" not in col.lower()]
-    volume_share_cols = [col for col in df.columns if "volume share" in col.lower()]
+    # Lower-case each column name once and reuse it for both filters
+    lowered = [(col, col.lower()) for col in df.columns]
+    volume_cols = [col for col, lower in lowered if "volume" in lower and "volume share" not in lower]
+    volume_share_cols = [col for col, lower in lowered if "volume share" in lower]
 
-    print(f"--- Debug: Identified volume columns (after initial rename): {volume_cols} ---") # Debug print
-    print(f"--- Debug: Identified volume share columns (after initial rename): {volume_share_cols} ---") # Debug print
+    log.debug("Identified volume columns (after initial rename): %s", volume_cols)
+    log.debug("Identified volume share columns (after initial rename): %s", volume_share_cols)
 
 
     # Ensure the target 'Volume' column exists and is initialized to None/NaN
     volume_col_target = 'Volume'
     if volume_col_target not in df.columns:
         df[volume_col_target] = pd.NA # Use pandas NA for missing numeric data
-    else:
-        # Attempt to convert the existing Volume column to numeric, coercing errors
-        df[volume_col_target] = pd.to_numeric(df[volume_col_target], errors='coerce')
-
 
-    # Consolidate data from all identified volume columns into the target 'Volume' column
-    # Prioritize non-null values from the source columns to fill the target 'Volume' column
-    for col in volume_cols:
-        # Check if the column exists before attempting to access it and is not the target column itself
-        if col in df.columns and col != volume_col_target:
-            # Coerce data in the source column to numeric, replacing errors with NaN
-            source_col_numeric = pd.to_numeric(df[col], errors='coerce')
-            print(f"--- Debug: Consolidating data from column '{col}'. First 5 values (numeric): {source_col_numeric.head().tolist()} ---") # Debug print
+    # Consolidate data from all identified volume columns into the target 'Volume' column in a single pass
+    # Coerce every candidate to numeric once, then take the first non-null value per row across
+    # [target, source_1, source_2, ...] - the same priority the old chained fillna loop gave
+    volume_sources = [col for col in volume_cols if col in df.columns and col != volume_col_target]
+    volume_candidates = df[[volume_col_target] + volume_sources].apply(coerce_numeric)
+    df[volume_col_target] = volume_candidates.bfill(axis=1).iloc[:, 0]
+    cols_to_drop.extend(volume_sources) # Mark the other volume columns for dropping
 
-            # Use fillna to merge data: fill NaNs in the target column with non-NaN values from the source
-            df[volume_col_target] = df[volume_col_target].fillna(source_col_numeric)
-
-            # Mark other volume columns for dropping, unless it's the target column itself
-            if col != volume_col_target:
-                 cols_to_drop.append(col)
-        elif col in df.columns and col == volume_col_target:
-             # If the target column itself is in the list, ensure its data is numeric
-             df[volume_col_target] = pd.to_numeric(df[volume_col_target], errors='coerce')
-
-
-    print(f"--- Debug: After consolidation, first 5 values in '{volume_col_target}': {df[volume_col_target].head().tolist()} ---") # Debug print
+    if log.isEnabledFor(logging.DEBUG): # Skip building the preview list unless debug logging is on
+        log.debug("After consolidation, first 5 values in '%s': %s", volume_col_target, df[volume_col_target].head().tolist())
 
 
     # Handle Volume Share - consolidate and apply percentage/rounding
@@ -103,26 +185,25 @@ def clean_columns(df):
     if volume_share_col_target not in df.columns:
         df[volume_share_col_target] = None
 
-    # Consolidate all identified volume share columns into the target 'Volume Share' column
-    for col in volume_share_cols:
-         if col in df.columns and col != volume_share_col_target:
-             source_col_numeric = pd.to_numeric(df[col], errors='coerce')
-             df[volume_share_col_target] = df[volume_share_col_target].fillna(source_col_numeric)
-             if col != volume_share_col_target:
-                 cols_to_drop.append(col)
-         elif col in df.columns and col == volume_share_col_target:
-             df[volume_share_col_target] = pd.to_numeric(df[volume_share_col_target], errors='coerce')
+    # Consolidate all identified volume share columns into the target 'Volume Share' column the same way
+    volume_share_sources = [col for col in volume_share_cols if col in df.columns and col != volume_share_col_target]
+    volume_share_candidates = df[[volume_share_col_target] + volume_share_sources].apply(coerce_numeric)
+    df[volume_share_col_target] = volume_share_candidates.bfill(axis=1).iloc[:, 0]
+    cols_to_drop.extend(volume_share_sources)
 
 
     # Apply percentage conversion and rounding to the final 'Volume Share' column
     if volume_share_col_target in df.columns:
-        # Multiply by 100 for percentage, coercing errors
-        df[volume_share_col_target] = pd.to_numeric(df[volume_share_col_target], errors='coerce') * 100
-        # Apply custom rounding
-        df[volume_share_col_target] = df[volume_share_col_target].apply(custom_round)
+        # Multiply by 100 for percentage (the consolidated column is already numeric)
+        share_pct = df[volume_share_col_target].to_numpy(dtype=float, na_value=np.nan) * 100.0
+        # Round half up (>= 0.5 goes up) in place on that fresh buffer, so no temporaries are allocated.
+        # (np.rint would round half to even.) NaN propagates through both ufuncs.
+        np.add(share_pct, 0.5, out=share_pct)
+        np.floor(share_pct, out=share_pct)
+        df[volume_share_col_target] = pd.array(share_pct, dtype="Float64").astype("Int64")
 
 
-    # Handle "Projected MFS Annual Qty" renaming (this was already handled by the initial colmap)
+    # Handle "Projected MFS Annual Qty" renaming (this was already handled by COLUMN_RENAMES)
     # if "Projected MFS Annual Qty" in df.columns:
     #      colmap["Projected MFS Annual Qty"] = "Projected MFS Annual Qty Unit Level"
     #      # Need to apply this renaming if not already done in the initial renaming step
@@ -159,228 +240,251 @@ def clean_columns(df):
     return df
 
 
-def insert_after(df, col_name, new_cols):
-    """Insert one or more new columns after col_name."""
-    cols = list(df.columns)
-    if col_name not in cols:
-        return df
-    idx = cols.index(col_name)
-    # Ensure new_cols are not already in df.columns before inserting
-    new_cols_to_insert = [nc for nc in new_cols if nc not in cols]
-    if not new_cols_to_insert:
-        return df # Nothing to insert
-
-    # Create a new list of columns including the new ones
-    new_cols_list = cols[:idx+1]
-    new_cols_list.extend(new_cols_to_insert)
-    new_cols_list.extend(cols[idx+1:])
-
-    # Reindex the DataFrame with the new column order and add empty columns using .loc
-    new_df = df.reindex(columns=new_cols_list)
-    # Do not add empty columns here, as clean_columns should ensure they exist with data if found
-    # The reindex itself will add them with NaN if they weren't in the original df columns
-
-    return new_df
-
-
-def insert_custom_columns(df):
-    # Insert "Form or Unit Type" after "Projected MFS Annual Qty Unit Level"
-    # These columns should now be handled by clean_columns and reindexing in main
-    # This function might become redundant if the desired order is handled by reindex in main
-    # Let's keep it for now but ensure it doesn't overwrite data.
-    # The reindex in main will set the final order and add missing columns as NaN.
-    return df # Returning df without modification for now
-
-
-def remove_unnamed_19(df):
-    if 'Unnamed: 19' in df.columns:
-        df = df.drop('Unnamed: 19', axis=1)
-    return df
-
-
-def load_and_prepare(file_path, manufacturer_name, sheet_name='Mapped Sheet'):
-    header_row = detect_header_row(file_path, sheet_name)
-    df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
+def is_wanted_column(name):
+    """True for header names that survive into the output: final-schema columns, renamed sources and any volume column."""
+    if pd.isna(name):
+        return False
+    name = str(name).strip()
+    return name in DESIRED_COLUMNS or name in COLUMN_RENAMES or "volume" in name.lower()
+
+
+def load_and_prepare(file_path, manufacturer_name, sheet_name='Mapped Sheet', xl=None):
+    # Parse the sheet once and locate the header in memory, instead of re-reading the file per step.
+    # Reuse the caller's open workbook (xl) when given, otherwise open the file just for this read.
+    with nullcontext(xl) if xl is not None else open_excel_file(file_path) as book:
+        raw_df = book.parse(sheet_name, header=None)
+    header_row = find_header_row(raw_df, file_path, sheet_name)
+    # Keep only the columns the pipeline can use before re-inferring dtypes on the data rows
+    keep = [pos for pos, name in enumerate(raw_df.iloc[header_row]) if is_wanted_column(name)]
+    # Volume columns are only ever used as numbers, so type them as float64 at ingest
+    df = split_at_header(raw_df.iloc[:, keep], header_row, is_float_column=lambda name: "volume" in str(name).lower())
     df = clean_columns(df) # Clean and drop manufacturer-specific volume columns
     if 'M.Item Name' not in df.columns:
         # If M.Item Name is lost after cleaning, it means the cleaning logic was too aggressive
         # or the original header detection was wrong. Re-raise with more context.
         raise ValueError(f"'M.Item Name' not found in dataframe columns after cleaning in file: {file_path}. Original columns: {list(df.columns)}")
 
-    # insert_custom_columns is now handled by reindexing in main, no need to call here
-    # df = insert_custom_columns(df)
-    df = remove_unnamed_19(df)
-    df = df[df['M.Item Name'].notna() & (df['M.Item Name'].astype(str).str.strip() != '')]
-    df['Manufacturer'] = manufacturer_name # Add Manufacturer column
-    return df
+    # Column placement is done once, by the reindex to DESIRED_COLUMNS at the end of this function
+    # Stray 'Unnamed: N' columns are never selected by is_wanted_column, so there is nothing to remove here
+    # Drop rows with a missing or blank M.Item Name in one vectorized strip + compare.
+    # The nullable string dtype keeps missing values as <NA> instead of materializing the text 'nan'.
+    # Only the mask is built from the string view; numeric item codes stay numbers in the output.
+    item_names = df['M.Item Name'].astype('string').str.strip()
+    df = df[(item_names.fillna('') != '').to_numpy()]
+    df['Manufacturer'] = pd.Series(manufacturer_name, index=df.index, dtype='string') # Add Manufacturer column
+    # Return the frame already in the final column order (missing columns added as None), so main can
+    # stack the files directly; this runs in the worker processes rather than once serially after the concat
+    return df.reindex(columns=DESIRED_COLUMNS)
+
+
+def header_fill_runs(columns):
+    """Return (fill name, first position, stop position) for each run of same-colored header cells."""
+    columns = [str(col).strip() for col in columns]
+    # Find the index of the 'Volume' column
+    volume_idx = columns.index("Volume") if "Volume" in columns else None
 
+    fills = []
+    for idx, value in enumerate(columns):
+        # Highlight NEW/FIXED columns in yellow
+        if value in NEWLY_ADDED_OR_FIXED:
+            fills.append("highlight_yellow")
+        elif volume_idx is not None:
+            # Compare the current column index with the index of 'Volume'
+            fills.append("light_orange" if idx <= volume_idx else "light_green") # Include Volume column in orange
+        else:
+            # If Volume column is not found, apply orange to all
+            fills.append("light_orange")
 
-def apply_header_colors(filepath, sheetname, header_row_index):
-    wb = load_workbook(filepath)
-    ws = wb[sheetname]
+    runs = []
+    for fill, run in groupby(enumerate(fills), key=lambda item: item[1]):
+        positions = [idx for idx, _ in run]
+        runs.append((fill, positions[0], positions[-1] + 1))
+    return runs
 
-    light_orange = PatternFill(start_color="FFD580", end_color="FFD580", fill_type="solid")
-    light_green = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    highlight_yellow = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
 
-    # Columns to highlight in yellow (only inserted custom columns)
-    # These should now be the ones the user explicitly mentioned are missing
-    newly_added_or_fixed = [
-        'Projected MFS Annual Qty Unit Level',
-        'Form or Unit Type',
-        'Potential at Pack Level',
-        'MFG Therapy Name' # Also highlight this as it was mentioned
-    ]
+# Every consolidated frame is reindexed to DESIRED_COLUMNS, so its header coloring is worked out once at import
+DESIRED_HEADER_RUNS = header_fill_runs(DESIRED_COLUMNS)
 
-    # Use the correct header row index (1-based for openpyxl)
-    # Add 1 to the 0-based pandas index
-    header_row_cells = list(ws[header_row_index + 1])
 
-    # Find the index of the 'Volume' column
-    volume_idx = None
-    for idx, cell in enumerate(header_row_cells):
-        if cell.value and str(cell.value).strip() == "Volume":
-            volume_idx = idx
-            break
-
-    for idx, cell in enumerate(header_row_cells):
-        value = "" if cell.value is None else str(cell.value).strip()
-        # Highlight NEW/FIXED columns in yellow
-        if value in newly_added_or_fixed:
-            cell.fill = highlight_yellow
-        elif volume_idx is not None:
-            # Compare the current column index with the index of 'Volume'
-            if idx <= volume_idx: # Include Volume column in orange
-                cell.fill = light_orange
-            else:
-                cell.fill = light_green
-        else:
-             # If Volume column is not found, apply orange to all
-            cell.fill = light_orange
+def write_with_header_colors(df, filepath, sheetname):
+    """Write df to filepath with xlsxwriter, coloring the header row in the same pass."""
+    with pd.ExcelWriter(filepath, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name=sheetname, index=False)
+        wb, ws = writer.book, writer.sheets[sheetname]
+
+        # One shared format object per color; xlsxwriter stores each as a single style record
+        formats = {name: wb.add_format({"bg_color": color}) for name, color in HEADER_COLORS.items()}
+
+        runs = DESIRED_HEADER_RUNS if df.columns.equals(DESIRED_COLUMNS) else header_fill_runs(df.columns)
+        # The header is always row 0 of the output sheet; rewrite it one same-color run at a time
+        for fill, first, stop in runs:
+            ws.write_row(0, first, list(df.columns[first:stop]), formats[fill])
+
+
+def read_index_a9(xl):
+    """Return the value of cell A9 (row 9, column 1) on the 'Index' sheet of an open pd.ExcelFile, or None."""
+    if xl.engine == "calamine":
+        # Ask calamine for the first 9 rows as plain Python values, skipping pandas' DataFrame construction.
+        # skip_empty_area=False keeps leading blank rows so row 9 stays at position 8.
+        rows = xl.book.get_sheet_by_name('Index').to_python(skip_empty_area=False, nrows=9)
+        cell_value = rows[8][0] if len(rows) >= 9 and rows[8] else None
+        # calamine reports every number as float; match openpyxl/pandas and give whole numbers back as int
+        if isinstance(cell_value, float) and cell_value.is_integer():
+            cell_value = int(cell_value)
+    else:
+        # Read a 9-row, single-column slice of the sheet
+        index_rows = xl.parse('Index', header=None, nrows=9, usecols=lambda c: c == 0, keep_default_na=False)
+        cell_value = index_rows.iat[8, 0] if len(index_rows) >= 9 else None
+    return None if cell_value == "" else cell_value
 
-    wb.save(filepath)
 
+def extract_manufacturer_name_from_index(file_path, xl=None):
+    """Extracts manufacturer name from 'Index' sheet, cell A9.
 
-def extract_manufacturer_name_from_index(file_path):
-    """Extracts manufacturer name from 'Index' sheet, cell A9 using openpyxl."""
-    print(f"--- Attempting to extract manufacturer name from '{file_path}' 'Index' sheet, cell A9 ---")
+    Pass an already open pd.ExcelFile as xl to reuse it instead of opening the file again.
+    """
+    log.debug("Attempting to extract manufacturer name from '%s' 'Index' sheet, cell A9", file_path)
     manufacturer_name = "Unknown Manufacturer"
     try:
-        wb = load_workbook(file_path, read_only=True)
-        if 'Index' in wb.sheetnames:
-            ws = wb['Index']
-            # Read cell A9 (row 9, column 1)
-            cell_value = ws.cell(row=9, column=1).value
-            print(f"--- Value found in cell A9: {cell_value} ---")
-            if pd.notna(cell_value):
-                manufacturer_name = str(cell_value).strip()
-        else:
-            print(f"⚠️ 'Index' sheet not found in file: {file_path}")
+        # nullcontext leaves a caller-owned workbook open; otherwise open (and close) one just for this lookup
+        with nullcontext(xl) if xl is not None else open_excel_file(file_path) as book:
+            if 'Index' in book.sheet_names:
+                cell_value = read_index_a9(book)
+                log.debug("Value found in cell A9: %s", cell_value)
+                # Strip once here so a whitespace-only A9 counts as empty whichever engine read it
+                if isinstance(cell_value, str):
+                    cell_value = cell_value.strip()
+                # A9 is a single scalar (or None); NaN is the only value not equal to itself
+                if cell_value not in (None, "") and not (isinstance(cell_value, float) and cell_value != cell_value):
+                    manufacturer_name = str(cell_value)
+            else:
+                log.warning("⚠️ 'Index' sheet not found in file: %s", file_path)
 
     except FileNotFoundError:
-        print(f"❌ Error: File not found at {file_path}")
+        log.error("❌ Error: File not found at %s", file_path)
     except Exception as e:
-        print(f"❌ Error extracting manufacturer name from {file_path} 'Index' sheet, cell A9: {e}")
-        print(f"--- Specific Error details: {type(e).__name__}: {e} ---")
+        log.error("❌ Error extracting manufacturer name from %s 'Index' sheet, cell A9: %s: %s", file_path, type(e).__name__, e)
 
-    print(f"--- Final extracted manufacturer name: {manufacturer_name} ---")
+    log.info("--- Final extracted manufacturer name: %s ---", manufacturer_name)
     return manufacturer_name
 
 
-def main():
-    if not os.path.exists(FOLDER_PATH):
-        print(f"❌ Folder '{FOLDER_PATH}' not found. Please create the folder and add Excel files.")
-        return
+def init_worker_logging(log_queue, level):
+    """Worker-process initializer: send every log record to the parent's queue instead of writing it directly."""
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [QueueHandler(log_queue)]
+    root_logger.setLevel(level)
 
-    all_xlsx = [f for f in os.listdir(FOLDER_PATH) if f.endswith('.xlsx')]
-    if not all_xlsx:
-        print(f"⚠️ No .xlsx files found in '{FOLDER_PATH}'")
-        return
 
-    all_data = []
-    # Store header row index for coloring the output file
-    output_header_row_index = 0 # Assuming header is always row 0 in the consolidated dataframe
+def process_file(full_path):
+    """Extract the manufacturer and load one workbook; runs in a worker process, so it must stay top-level.
 
-    for file in all_xlsx:
-        full_path = os.path.join(FOLDER_PATH, file)
+    Returns the prepared dataframe and the set of its columns that hold at least one value.
+    """
+    # Open the workbook once and share it between the 'Index' lookup and the 'Mapped Sheet' load
+    with open_excel_file(full_path) as xl:
         # Extract manufacturer name from the 'INDEX' sheet
-        manufacturer = extract_manufacturer_name_from_index(full_path)
+        manufacturer = extract_manufacturer_name_from_index(full_path, xl)
+        log.info("--- Processing file: %s ---", os.path.basename(full_path))
+        # Header detection happens inside load_and_prepare on the same parse of the sheet
+        # Pass the extracted manufacturer name to load_and_prepare
+        df = load_and_prepare(full_path, manufacturer, xl=xl)
+    # Every frame has the full DESIRED_COLUMNS schema after the reindex, so report which columns actually have data
+    return df, frozenset(df.columns[df.notna().any().to_numpy()])
+
+
+def collect_results(futures):
+    """Read (file name, future) pairs in order and return the kept frames and their filled-column sets.
 
+    Pairs are popped off the deque as they are read, so once this returns the lists it hands back
+    hold the only references to the per-file frames.
+    """
+    all_data = []
+    filled_column_sets = []
+    while futures:
+        file, future = futures.popleft()
         try:
-            print(f"--- Processing file: {file} ---")
-            # Detect header row before loading and preparing the dataframe
-            # Note: The header index detected here is 0-based for pandas read_excel
-            # We don't need to store this for coloring the *output* file,
-            # as the output header is always at index 0 of the consolidated dataframe.
-            header_row_index_pandas = detect_header_row(full_path)
-            # Pass the extracted manufacturer name to load_and_prepare
-            df = load_and_prepare(full_path, manufacturer)
-            all_data.append(df)
-            print(f"✅ Successfully processed: {file}")
+            df, filled_columns = future.result()
         except Exception as e:
-            print(f"❌ Skipped {file}, reason: {type(e).__name__}: {e}") # Added more specific error info
+            log.warning("❌ Skipped %s, reason: %s: %s", file, type(e).__name__, e)
+            continue
+        # Drop files with no data in any critical column before they reach the concat and the output
+        if filled_columns.isdisjoint(CRITICAL_COLUMNS):
+            log.warning("❌ Skipped %s, reason: none of %s have any data", file, CRITICAL_COLUMNS)
+            continue
+        all_data.append(df)
+        filled_column_sets.append(filled_columns)
+        log.info("✅ Successfully processed: %s", file)
+    return all_data, filled_column_sets
+
+
+def main():
+    if not os.path.exists(FOLDER_PATH):
+        log.error("❌ Folder '%s' not found. Please create the folder and add Excel files.", FOLDER_PATH)
+        return
+
+    # scandir entries carry the joined path and cached file type, so no per-file os.path.join/stat is needed
+    all_xlsx = [entry for entry in os.scandir(FOLDER_PATH) if entry.name.endswith('.xlsx') and entry.is_file()]
+    if not all_xlsx:
+        log.warning("⚠️ No .xlsx files found in '%s'", FOLDER_PATH)
+        return
+
+    # Workers push their log records onto this queue; a single listener here writes them out,
+    # so output is not interleaved and workers never block on stdout
+    log_queue = multiprocessing.Queue()
+    root_logger = logging.getLogger()
+    listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        # Each file is independent, so load and clean them in parallel worker processes.
+        # Results are collected in listing order so the consolidated row order stays deterministic.
+        # Never start more workers than there are files (each worker pays a pandas import on start-up)
+        with ProcessPoolExecutor(max_workers=min(len(all_xlsx), os.cpu_count() or 1),
+                                 initializer=init_worker_logging, initargs=(log_queue, root_logger.level)) as executor:
+            # A finished future keeps its result alive, so collect_results pops each one as it is read
+            futures = deque((entry.name, executor.submit(process_file, entry.path)) for entry in all_xlsx)
+            all_data, filled_column_sets = collect_results(futures)
+    finally:
+        listener.stop()
 
     if not all_data:
-        print("⛔ No valid data to save.")
+        log.error("⛔ No valid data to save.")
         return
 
-    # Concatenate dataframes
-    consolidated_df = pd.concat(all_data, ignore_index=True)
+    # Flag output columns that no file filled; they will be written out empty
+    empty_columns = [col for col in DESIRED_COLUMNS if not any(col in filled for filled in filled_column_sets)]
+    if empty_columns:
+        log.warning("⚠️ No file has data for columns: %s", empty_columns)
 
-    # Define the desired final column order based on user's implicit order and requirements
-    desired_columns = [
-        "Manufacturer",
-        "Hospital Name",
-        "MFS",
-        "Therapy",
-        "Projected MFS Annual Qty Unit Level", # This should now be populated
-        "Form or Unit Type", # This should now be populated
-        "Volume Share",
-        "Volume",
-        "M.Item Name",
-        "MFG Therapy Name", # This should now be populated
-        "Potential at Pack Level", # This should now be populated
-        "FORM OR UNIT TYPE BY AP",
-        "UPP",
-        "UPP BY AP",
-        "MRP / Pack level",
-        "Cost / Pack level",
-        "MRP / Unit level",
-        "Cost / Unit level",
-        "GST%",
-        "Quote Validity till date",
-        "Scheme",
-        "Scheme Validity till date",
-        "Turn Over Discount",
-        "TOD Validity till date",
-    ]
-
-    # Reindex the DataFrame to match the desired column order, adding missing columns as None
-    # This will also handle the placement of the newly populated columns
-    consolidated_df = consolidated_df.reindex(columns=desired_columns)
+    # Concatenate dataframes; load_and_prepare already put every frame in DESIRED_COLUMNS order,
+    # so concat stacks them without building a union of their column sets
+    consolidated_df = pd.concat(all_data, ignore_index=True)
+    # Drop the per-file frames right away so only the consolidated copy is held through the rest of main
+    # (all_data holds the last reference to each of them)
+    all_data.clear()
+    # Manufacturer repeats one name per file across every row: store it as codes + a small category table
+    consolidated_df['Manufacturer'] = consolidated_df['Manufacturer'].astype('category')
 
     # Ensure 'Therapy' column is populated if 'MFG Therapy Name' exists and 'Therapy' is None
     # This logic seems correct and should remain
     if 'Therapy' in consolidated_df.columns and 'MFG Therapy Name' in consolidated_df.columns:
-        consolidated_df['Therapy'] = consolidated_df['Therapy'].fillna(consolidated_df['MFG Therapy Name'])
+        # Select between the two underlying arrays in one np.where pass instead of an index-aligned fillna
+        therapy = consolidated_df['Therapy'].to_numpy()
+        mfg_therapy = consolidated_df['MFG Therapy Name'].to_numpy()
+        consolidated_df['Therapy'] = np.where(pd.isna(therapy), mfg_therapy, therapy)
 
-    # Ensure Volume Share is numeric and rounded after reindexing
-    # This logic seems correct and should remain
+    # Ensure Volume Share is numeric after concatenation (percentage and rounding were applied in clean_columns)
     volume_share_col_target = 'Volume Share'
     if volume_share_col_target in consolidated_df.columns:
-         consolidated_df[volume_share_col_target] = pd.to_numeric(consolidated_df[volume_share_col_target], errors='coerce')
-         # Apply percentage conversion and custom rounding only if the data is numeric
-         if pd.api.types.is_numeric_dtype(consolidated_df[volume_share_col_target]):
-            consolidated_df[volume_share_col_target] = consolidated_df[volume_share_col_target] # Remove the division by 100
-            # The rounding should ideally happen in clean_columns. Let's trust that for now.
-
+        consolidated_df[volume_share_col_target] = coerce_numeric(consolidated_df[volume_share_col_target])
 
-    consolidated_df.to_excel(OUTPUT_FILE, sheet_name=OUTPUT_SHEETNAME, index=False)
-    # Pass the header row index for coloring the output file (always 0 for the dataframe header)
-    apply_header_colors(OUTPUT_FILE, OUTPUT_SHEETNAME, output_header_row_index)
+    # Write and color the header in one pass instead of re-opening the saved file with openpyxl
+    write_with_header_colors(consolidated_df, OUTPUT_FILE, OUTPUT_SHEETNAME)
 
-    print(f"\n✅ All done! Final Excel file saved as: {OUTPUT_FILE}")
+    log.info("✅ All done! Final Excel file saved as: %s", OUTPUT_FILE)
 
 
 if __name__ == "__main__":
+    # Per-file progress is logged at INFO; use level=logging.DEBUG to see column consolidation details
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
\ No newline at end of file